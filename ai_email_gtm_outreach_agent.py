@@ -1,150 +1,1153 @@
-import json
+import asyncio
+import atexit
+import hashlib
+import importlib.util
+import itertools
 import os
+import sqlite3
 import sys
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from typing import Any, Awaitable, Coroutine, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type, TypeVar, get_args
+from urllib.parse import urlparse
 
+import httpx
+import ijson
+import orjson
+import pandas as pd
 import streamlit as st
 from agno.agent import Agent
-from agno.run.agent import RunOutput
+from agno.exceptions import ModelProviderError
+from agno.run.agent import RunContentEvent, RunErrorEvent, RunOutput
+from agno.run.base import RunStatus
 from agno.db.sqlite import SqliteDb
 from agno.models.openai import OpenAIChat
 from agno.tools.exa import ExaTools
+from aiolimiter import AsyncLimiter
+from openai import OpenAI, RateLimitError
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import create_engine
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 import prompts
 
 
+DB_FILE = "tmp/gtm_outreach.db"
+
+# Exa results older than this are re-fetched. Reddit threads move faster than leadership pages.
+EXA_CACHE_TTL_SECONDS = 7 * 24 * 3600
+EXA_REDDIT_CACHE_TTL_SECONDS = 24 * 3600
+
+EMAIL_WRITER_MODEL_ID = "gpt-5"
+# Enrichment also does the insight research, so it stays on the research model rather
+# than the small extraction model; the strict schema already guarantees the output shape.
+ENRICHMENT_MODEL_ID = "gpt-5"
+
+# Structured Outputs schemas for the extraction agents; the API guarantees responses match them.
+COMPANY_SCHEMA = {
+    "name": "companies",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "companies": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "website": {"type": "string"},
+                        "why_fit": {"type": "string"},
+                    },
+                    "required": ["name", "website", "why_fit"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["companies"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
+ENRICHMENT_SCHEMA = {
+    "name": "company_enrichment",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "companies": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "contacts": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "full_name": {"type": "string"},
+                                    "title": {"type": "string"},
+                                    "email": {"type": "string"},
+                                    "inferred": {"type": "boolean"},
+                                },
+                                "required": ["full_name", "title", "email", "inferred"],
+                                "additionalProperties": False,
+                            },
+                        },
+                        "insights": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["name", "contacts", "insights"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["companies"],
+        "additionalProperties": False,
+    },
+    "strict": True,
+}
+
+
+class Company(BaseModel):
+    name: str
+    website: str
+    why_fit: str
+
+
+class CompanyList(BaseModel):
+    companies: List[Company]
+
+
+class Contact(BaseModel):
+    full_name: str
+    title: str
+    email: str
+    inferred: bool
+
+
+class CompanyEnrichment(BaseModel):
+    name: str
+    contacts: List[Contact]
+    insights: List[str]
+
+
+class EnrichmentList(BaseModel):
+    companies: List[CompanyEnrichment]
+
+
+class Email(BaseModel):
+    company: str
+    contact: str
+    subject: str
+    body: str
+
+
+class EmailList(BaseModel):
+    emails: List[Email]
+
+
+ListModel = TypeVar("ListModel", bound=BaseModel)
+
+# Above this many companies emails are written one contact per request instead of in one shot.
+EMAIL_FANOUT_MIN_COMPANIES = 5
+EMAIL_WRITER_MAX_CONCURRENCY = 10
+
+# Per-company enrichment runs in flight at once.
+COMPANY_FANOUT_MAX_CONCURRENCY = 5
+BATCH_POLL_INTERVAL_SECONDS = 15
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Concurrent pipeline runs across all sessions, and how often the progress fragment refreshes.
+PIPELINE_MAX_WORKERS = 4
+STATUS_POLL_INTERVAL_SECONDS = 0.5
+
+# Requests per minute for async agent runs; each run fans out into Exa searches.
+EXA_RATE_LIMIT_PER_MINUTE = 100
+
+# Shared OpenAI connection pools (one sync, one async); keep-alive connections are multiplexed over HTTP/2.
+HTTP_TIMEOUT_SECONDS = 60.0
+HTTP_MAX_CONNECTIONS = 40
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+# httpx only speaks HTTP/2 with the optional h2 package (httpx[http2]); fall back to HTTP/1.1 keep-alive without it.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Upper bound on streamed model output kept around for error reporting.
+MAX_STREAM_BUFFER_CHARS = 10 * 1024 * 1024
+
+
 def require_env(var_name: str) -> None:
     if not os.getenv(var_name):
         print(f"Error: {var_name} not set. export {var_name}=...")
         sys.exit(1)
 
 
-def create_company_finder_agent() -> Agent:
-    exa_tools = ExaTools(category="company")
-    db = SqliteDb(db_file="tmp/gtm_outreach.db")
-    return Agent(
-        model=OpenAIChat(id="gpt-4o"),
-        tools=[exa_tools],
-        db=db,
-        enable_user_memories=True,
-        add_history_to_context=True,
-        num_history_runs=6,
-        session_id="gtm_outreach_company_finder",
-        debug_mode=True,
-        instructions=prompts.COMPANY_FINDER_INSTRUCTIONS,
+def debug_enabled() -> bool:
+    return os.getenv("GTM_DEBUG") == "1"
+
+
+def init_exa_cache(db_file: str = DB_FILE) -> None:
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    with closing(sqlite3.connect(db_file)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS exa_cache (key TEXT PRIMARY KEY, tool TEXT, value BLOB, ts INTEGER)"
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def _db() -> SqliteDb:
+    """One SQLite handle shared by every agent, kept across reruns.
+
+    Streamlit reruns the script on its own threads, so the connection must not be
+    pinned to the thread that created it.
+    """
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+    return SqliteDb(db_engine=create_engine(f"sqlite:///{DB_FILE}", connect_args={"check_same_thread": False}))
+
+
+class RunFailedError(RuntimeError):
+    """A failure that agno or ExaTools reported as a return value instead of raising."""
+
+
+def _looks_rate_limited(text: str) -> bool:
+    text = text.lower()
+    return "429" in text or "rate limit" in text or "rate_limit" in text or "too many requests" in text
+
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    # agno wraps provider errors, keeping the HTTP status
+    if isinstance(exc, ModelProviderError):
+        return exc.status_code == 429
+    if isinstance(exc, RunFailedError):
+        return _looks_rate_limited(str(exc))
+    return isinstance(exc, RateLimitError)
+
+
+_retry_rate_limited = retry(
+    wait=wait_exponential_jitter(),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(_is_rate_limited),
+    reraise=True,
+)
+
+# The model is waiting on the tool call, so keep Exa backoff short
+_retry_exa_rate_limited = retry(
+    wait=wait_exponential_jitter(max=8),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception(_is_rate_limited),
+    reraise=True,
+)
+
+
+def _raise_if_exa_rate_limited(value: str) -> str:
+    if value.startswith("Error") and _looks_rate_limited(value):
+        raise RunFailedError(value)
+    return value
+
+
+@_retry_exa_rate_limited
+def _fetch_exa(fetch: Callable[[], str]) -> str:
+    return _raise_if_exa_rate_limited(fetch())
+
+
+@_retry_exa_rate_limited
+async def _afetch_exa(fetch: Callable[[], str]) -> str:
+    # tenacity backs off with asyncio.sleep for coroutines, so the loop keeps running
+    return _raise_if_exa_rate_limited(await asyncio.to_thread(fetch))
+
+
+class CachedExaTools(ExaTools):
+    """ExaTools that persist search/content results in the app's SQLite db, keyed by tool + args."""
+
+    def __init__(self, *args: Any, db_file: str = DB_FILE, ttl_seconds: int = EXA_CACHE_TTL_SECONDS, **kwargs: Any):
+        self.db_file = db_file
+        self.ttl_seconds = ttl_seconds
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def _cache_key(tool: str, args: Dict[str, Any]) -> str:
+        return hashlib.sha1(orjson.dumps({"tool": tool, **args}, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    def _lookup(self, key: str, ttl_seconds: int) -> Optional[str]:
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            row = conn.execute("SELECT value, ts FROM exa_cache WHERE key=?", (key,)).fetchone()
+        if row is not None and int(time.time()) - row[1] < ttl_seconds:
+            return row[0]
+        return None
+
+    def _store(self, key: str, tool: str, value: str) -> None:
+        if value.startswith("Error"):
+            # ExaTools reports failures as strings; don't pin them in the cache
+            return
+        with closing(sqlite3.connect(self.db_file)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO exa_cache (key, tool, value, ts) VALUES (?, ?, ?, ?)",
+                (key, tool, value, int(time.time())),
+            )
+
+    def _cached(self, tool: str, args: Dict[str, Any], ttl_seconds: int, fetch: Callable[[], str]) -> str:
+        key = self._cache_key(tool, args)
+        cached = self._lookup(key, ttl_seconds)
+        if cached is not None:
+            return cached
+        try:
+            value = _fetch_exa(fetch)
+        except RunFailedError as e:
+            # Still rate limited after retrying; hand the error back to the model as ExaTools would
+            return str(e)
+        self._store(key, tool, value)
+        return value
+
+    def search_exa(self, query: str, num_results: int = 5, category: Optional[str] = None) -> str:
+        """Use this function to search Exa (a web search engine) for a query.
+
+        Args:
+            query (str): The query to search for.
+            num_results (int): Number of results to return. Defaults to 5.
+            category (Optional[str]): The category to filter search results.
+                Options are "company", "research paper", "news", "pdf", "github",
+                "tweet", "personal site", "linkedin profile", "financial report".
+
+        Returns:
+            str: The search results in JSON format.
+        """
+        args = {"query": query, "num_results": num_results, "category": category or self.category}
+        ttl = EXA_REDDIT_CACHE_TTL_SECONDS if "reddit" in query.lower() else self.ttl_seconds
+        return self._cached("search_exa", args, ttl, lambda: super(CachedExaTools, self).search_exa(query, num_results, category))
+
+    def get_contents(self, urls: List[str]) -> str:
+        """Retrieve detailed content from specific URLs using the Exa API.
+
+        Args:
+            urls (List[str]): A list of URLs from which to fetch content.
+
+        Returns:
+            str: The search results in JSON format.
+        """
+        args = {"urls": urls}
+        ttl = EXA_REDDIT_CACHE_TTL_SECONDS if any("reddit.com" in u for u in urls) else self.ttl_seconds
+        return self._cached("get_contents", args, ttl, lambda: super(CachedExaTools, self).get_contents(urls))
+
+
+class AsyncCachedExaTools(CachedExaTools):
+    """CachedExaTools for agents run on the shared event loop.
+
+    The SQLite cache and the Exa HTTP call are blocking, so they run in a worker thread;
+    run inline they would stall every coroutine on the loop and serialize the fan-out.
+    """
+
+    async def _acached(self, tool: str, args: Dict[str, Any], ttl_seconds: int, fetch: Callable[[], str]) -> str:
+        key = self._cache_key(tool, args)
+        cached = await asyncio.to_thread(self._lookup, key, ttl_seconds)
+        if cached is not None:
+            return cached
+        try:
+            value = await _afetch_exa(fetch)
+        except RunFailedError as e:
+            return str(e)
+        await asyncio.to_thread(self._store, key, tool, value)
+        return value
+
+    async def search_exa(self, query: str, num_results: int = 5, category: Optional[str] = None) -> str:
+        """Use this function to search Exa (a web search engine) for a query.
+
+        Args:
+            query (str): The query to search for.
+            num_results (int): Number of results to return. Defaults to 5.
+            category (Optional[str]): The category to filter search results.
+                Options are "company", "research paper", "news", "pdf", "github",
+                "tweet", "personal site", "linkedin profile", "financial report".
+
+        Returns:
+            str: The search results in JSON format.
+        """
+        args = {"query": query, "num_results": num_results, "category": category or self.category}
+        ttl = EXA_REDDIT_CACHE_TTL_SECONDS if "reddit" in query.lower() else self.ttl_seconds
+        return await self._acached("search_exa", args, ttl, lambda: ExaTools.search_exa(self, query, num_results, category))
+
+    async def get_contents(self, urls: List[str]) -> str:
+        """Retrieve detailed content from specific URLs using the Exa API.
+
+        Args:
+            urls (List[str]): A list of URLs from which to fetch content.
+
+        Returns:
+            str: The search results in JSON format.
+        """
+        args = {"urls": urls}
+        ttl = EXA_REDDIT_CACHE_TTL_SECONDS if any("reddit.com" in u for u in urls) else self.ttl_seconds
+        return await self._acached("get_contents", args, ttl, lambda: ExaTools.get_contents(self, urls))
+
+
+@st.cache_resource(show_spinner=False)
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived loop for all async agent work.
+
+    The shared async HTTP client and the agents' cached async OpenAI clients are bound to
+    the loop they first run on, so every async stage must run on this one.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="gtm_event_loop", daemon=True).start()
+    return loop
+
+
+def _run_async(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run `coro` on the shared event loop and block the calling (worker) thread until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+
+@st.cache_resource(show_spinner=False)
+def _exa_limiter() -> AsyncLimiter:
+    """One limiter for the whole process; a module-level one would be rebuilt on every rerun."""
+    return AsyncLimiter(EXA_RATE_LIMIT_PER_MINUTE, 60)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_sync_http_client() -> httpx.Client:
+    """Client for agents that only run synchronously; agno ignores an AsyncClient on sync calls."""
+    client = httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=HTTP_MAX_CONNECTIONS,
+        ),
     )
+    atexit.register(client.close)
+    return client
 
 
-def create_contact_finder_agent() -> Agent:
-    exa_tools = ExaTools()
-    db = SqliteDb(db_file="tmp/gtm_outreach.db")
+@st.cache_resource(show_spinner=False)
+def _shared_async_http_client() -> httpx.AsyncClient:
+    """Client for agents run on the shared event loop."""
+    client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=HTTP_MAX_CONNECTIONS,
+        ),
+    )
+    loop = _event_loop()
+    atexit.register(lambda: asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5))
+    return client
+
+
+@st.cache_resource(show_spinner=False)
+def create_company_finder_agent() -> Agent:
+    exa_tools = CachedExaTools(category="company")
     return Agent(
-        model=OpenAIChat(id="gpt-4o"),
+        model=OpenAIChat(
+            id="gpt-4o-mini",
+            request_params={"response_format": {"type": "json_schema", "json_schema": COMPANY_SCHEMA}},
+            extra_body={"prompt_cache_key": "gtm_company_finder"},
+            http_client=_shared_sync_http_client(),
+        ),
         tools=[exa_tools],
-        db=db,
-        enable_user_memories=True,
-        add_history_to_context=True,
-        num_history_runs=6,
-        session_id="gtm_outreach_contact_finder",
-        debug_mode=True,
-        instructions=prompts.CONTACT_FINDER_INSTRUCTIONS,
+        db=_db(),
+        enable_user_memories=False,
+        add_history_to_context=False,
+        num_history_runs=0,
+        session_id="gtm_outreach_company_finder",
+        debug_mode=debug_enabled(),
+        instructions=prompts.COMPANY_FINDER_INSTRUCTIONS,
     )
 
 
+@st.cache_resource(show_spinner=False)
 def create_email_writer_agent(style_key: str = "Professional") -> Agent:
-    db = SqliteDb(db_file="tmp/gtm_outreach.db")
     instructions = prompts.get_email_writer_instructions(style_key)
     return Agent(
-        model=OpenAIChat(id="gpt-5"),
+        model=OpenAIChat(
+            id=EMAIL_WRITER_MODEL_ID,
+            extra_body={"prompt_cache_key": "gtm_email_writer"},
+            http_client=_shared_sync_http_client(),
+        ),
         tools=[],
-        db=db,
+        db=_db(),
         enable_user_memories=True,
         add_history_to_context=True,
-        num_history_runs=6,
+        num_history_runs=1,
         session_id="gtm_outreach_email_writer",
-        debug_mode=False,
+        debug_mode=debug_enabled(),
         instructions=instructions,
     )
 
 
-def create_research_agent() -> Agent:
-    """Agent to gather interesting insights from company websites and Reddit."""
-    exa_tools = ExaTools()
-    db = SqliteDb(db_file="tmp/gtm_outreach.db")
+@st.cache_resource(show_spinner=False)
+def create_email_fanout_agent(style_key: str = "Professional") -> Agent:
+    """History- and memory-free email writer for concurrent one-contact runs.
+
+    Concurrent runs on the shared writer session would race on its stored history and
+    memories and replay other contacts' emails into each prompt.
+    """
     return Agent(
-        model=OpenAIChat(id="gpt-5"),
+        model=OpenAIChat(
+            id=EMAIL_WRITER_MODEL_ID,
+            extra_body={"prompt_cache_key": "gtm_email_writer"},
+            http_client=_shared_async_http_client(),
+        ),
+        tools=[],
+        debug_mode=debug_enabled(),
+        instructions=prompts.get_email_writer_instructions(style_key),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def create_combined_enrichment_agent() -> Agent:
+    """Agent that finds contacts and researches insights for one company per run.
+
+    The fan-out runs it concurrently, so like the email fan-out agent it has no db or
+    session: concurrent runs would overwrite each other's stored session row.
+    """
+    exa_tools = AsyncCachedExaTools()
+    return Agent(
+        model=OpenAIChat(
+            id=ENRICHMENT_MODEL_ID,
+            request_params={
+                "parallel_tool_calls": True,
+                "response_format": {"type": "json_schema", "json_schema": ENRICHMENT_SCHEMA},
+            },
+            extra_body={"prompt_cache_key": "gtm_enrichment"},
+            http_client=_shared_async_http_client(),
+        ),
         tools=[exa_tools],
-        db=db,
-        enable_user_memories=True,
-        add_history_to_context=True,
-        num_history_runs=6,
-        session_id="gtm_outreach_researcher",
-        debug_mode=True,
-        instructions=prompts.RESEARCH_AGENT_INSTRUCTIONS,
+        tool_choice="auto",
+        debug_mode=debug_enabled(),
+        instructions=prompts.ENRICHMENT_AGENT_INSTRUCTIONS,
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def create_json_fixer_agent(use_async: bool = False) -> Agent:
+    """Small model that rewrites a malformed response so it matches the expected schema.
+
+    `parse` and `aparse` each get their own instance so it can carry the matching HTTP client.
+    """
+    return Agent(
+        model=OpenAIChat(
+            id="gpt-4o-mini",
+            request_params={"response_format": {"type": "json_object"}},
+            extra_body={"prompt_cache_key": "gtm_json_fixer"},
+            http_client=_shared_async_http_client() if use_async else _shared_sync_http_client(),
+        ),
+        tools=[],
+        session_id="gtm_outreach_json_fixer",
+        debug_mode=debug_enabled(),
+        instructions=prompts.JSON_FIXER_INSTRUCTIONS,
     )
 
 
-def extract_json_or_raise(text: str) -> Dict[str, Any]:
-    """Extract JSON from a model response. Assumes the response is pure JSON."""
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _company_key(company: Dict[str, Any]) -> str:
+    """Normalized domain of the company's website, falling back to its name."""
+    website = (company.get("website") or "").strip().lower()
+    parsed = urlparse(website if "//" in website else f"//{website}")
+    domain = parsed.netloc.removeprefix("www.")
+    return domain or (company.get("name") or "").strip().lower()
+
+
+def _slim(companies: List[Dict[str, Any]], keys: Iterable[str]) -> List[Dict[str, Any]]:
+    """Keep only `keys` from each company so prompts don't carry fields the agent won't use."""
+    return [{k: c[k] for k in keys if k in c} for c in companies]
+
+
+# The enrichment agent only needs to know which company to look up
+ENRICHMENT_COMPANY_KEYS = ("name", "website")
+
+
+@_retry_rate_limited
+def _start_stream(agent: Agent, prompt: str) -> Tuple[List[Any], Iterator[Any]]:
+    """Start a streamed run and buffer events up to the first content delta.
+
+    Model and tool requests made before any content is handed out can be retried safely.
+    """
+    events = iter(agent.run(prompt, stream=True))
+    head: List[Any] = []
+    for event in events:
+        _raise_for_error_event(event)
+        head.append(event)
+        if isinstance(event, RunContentEvent):
+            break
+    return head, events
+
+
+def _raise_for_error_event(event: Any) -> None:
+    # agno catches provider errors (429s included) and yields them as an event
+    if isinstance(event, RunErrorEvent):
+        raise RunFailedError(str(event.content or "Agent run failed"))
+
+
+def _raise_for_status(resp: RunOutput) -> RunOutput:
+    # ...and returns them as an errored RunOutput from non-streamed runs
+    if resp.status == RunStatus.error:
+        raise RunFailedError(str(resp.content or "Agent run failed"))
+    return resp
+
+
+@_retry_rate_limited
+def _run_agent(agent: Agent, prompt: str) -> RunOutput:
+    return _raise_for_status(agent.run(prompt))
+
+
+@_retry_rate_limited
+async def _arun_agent(agent: Agent, prompt: str) -> RunOutput:
+    async with _exa_limiter():
+        return _raise_for_status(await agent.arun(prompt))
+
+
+def _list_key(model: Type[BaseModel]) -> str:
+    """Name of the single list field on a *List response model, e.g. 'companies'."""
+    return next(iter(model.model_fields))
+
+
+def _item_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    return get_args(model.model_fields[_list_key(model)].annotation)[0]
+
+
+def _fix_prompt(text: str, model: Type[BaseModel], error: ValidationError) -> str:
+    # Errored runs already raised in _run_agent/_arun_agent; an empty response has nothing to salvage
+    if not text.strip():
+        raise ValueError(f"Model returned an empty response instead of {model.__name__}")
+    return prompts.JSON_FIXER_PROMPT_TEMPLATE.substitute(
+        schema_json=_dumps(model.model_json_schema()),
+        errors=str(error),
+        original=text,
+    )
+
+
+def _validate_fixed(text: str, fixed: str, model: Type[ListModel]) -> ListModel:
     try:
-        return json.loads(text)
-    except Exception as e:
-        # Try to locate a JSON block if extra text snuck in
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            candidate = text[start : end + 1]
-            return json.loads(candidate)
-        raise ValueError(f"Failed to parse JSON: {e}\nResponse was:\n{text}")
+        parsed = model.model_validate_json(fixed)
+    except ValidationError as e:
+        raise ValueError(f"Response did not match {model.__name__} after one fix-up attempt: {e}\nResponse was:\n{text}")
+    # The original was non-empty and invalid, so an empty list means the fixer dropped it
+    if not getattr(parsed, _list_key(model)):
+        raise ValueError(f"Response had no usable {_list_key(model)} after one fix-up attempt\nResponse was:\n{text}")
+    return parsed
+
+
+def parse(text: str, model: Type[ListModel]) -> ListModel:
+    """Validate a model response against `model`, asking the JSON fixer once if it doesn't match."""
+    try:
+        return model.model_validate_json(text)
+    except ValidationError as e:
+        resp: RunOutput = _run_agent(create_json_fixer_agent(), _fix_prompt(text, model, e))
+        return _validate_fixed(text, str(resp.content), model)
+
+
+async def aparse(text: str, model: Type[ListModel]) -> ListModel:
+    """Async variant of `parse` for use inside the fan-out stages."""
+    try:
+        return model.model_validate_json(text)
+    except ValidationError as e:
+        resp: RunOutput = await _arun_agent(create_json_fixer_agent(use_async=True), _fix_prompt(text, model, e))
+        return _validate_fixed(text, str(resp.content), model)
+
+
+def _dump_items(parsed: BaseModel) -> List[Dict[str, Any]]:
+    return [item.model_dump() for item in getattr(parsed, _list_key(type(parsed)))]
+
+
+def stream_content(agent: Agent, prompt: str) -> Iterator[str]:
+    """Yield the model's content deltas as they arrive."""
+    head, events = _start_stream(agent, prompt)
+    for event in itertools.chain(head, events):
+        _raise_for_error_event(event)
+        if isinstance(event, RunContentEvent) and isinstance(event.content, str):
+            yield event.content
 
 
-def run_company_finder(agent: Agent, target_desc: str, offering_desc: str, max_companies: int) -> List[Dict[str, str]]:
-    prompt = prompts.COMPANY_FINDER_PROMPT_TEMPLATE.format(
+class StreamedText:
+    """Read-only file-like view over streamed text so ijson can parse it incrementally."""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._pending = b""
+        self._seen: List[str] = []
+        self._seen_chars = 0
+
+    def _pull(self) -> bool:
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        self._seen_chars += len(chunk)
+        if self._seen_chars > MAX_STREAM_BUFFER_CHARS:
+            raise ValueError(f"Model response exceeded {MAX_STREAM_BUFFER_CHARS} characters")
+        self._seen.append(chunk)
+        self._pending += chunk.encode()
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        """Return whatever has arrived, waiting only while nothing is buffered.
+
+        Short reads are valid for file-like objects (only b"" means EOF), and returning
+        early is what lets ijson yield items while the model is still generating.
+        """
+        if size < 0:
+            while self._pull():
+                pass
+            data, self._pending = self._pending, b""
+            return data
+        while not self._pending and self._pull():
+            pass
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def text(self) -> str:
+        return "".join(self._seen)
+
+
+def stream_json_items(
+    agent: Agent,
+    prompt: str,
+    model: Type[BaseModel],
+    on_item: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Run the agent with streaming and return the validated items of `model`'s list field.
+
+    `on_item` is called with each item as soon as it has been parsed and validated. If the
+    stream is malformed, or yields no items (which is also what a missing or misnamed
+    top-level key looks like), the full response goes through `parse` instead.
+    """
+    key, item_model = _list_key(model), _item_model(model)
+    stream = StreamedText(stream_content(agent, prompt))
+    items: List[Dict[str, Any]] = []
+    try:
+        for raw in ijson.items(stream, f"{key}.item", use_float=True):
+            item = item_model.model_validate(raw).model_dump()
+            items.append(item)
+            if on_item:
+                on_item(item)
+        # Drain the rest so the run completes and is stored
+        stream.read()
+    except (ijson.JSONError, ValidationError):
+        stream.read()
+        return _dump_items(parse(stream.text(), model))
+    if not items:
+        # Validates the outer object, e.g. {"results": [...]} or a bare [...]
+        return _dump_items(parse(stream.text(), model))
+    return items
+
+
+def dedupe_companies(companies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    seen: Set[str] = set()
+    return [c for c in companies if not ((key := _company_key(c)) in seen or seen.add(key))]
+
+
+def run_company_finder(
+    agent: Agent,
+    target_desc: str,
+    offering_desc: str,
+    max_companies: int,
+    on_company: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, str]]:
+    prompt = prompts.COMPANY_FINDER_PROMPT_TEMPLATE.substitute(
         max_companies=max_companies,
         target_desc=target_desc,
         offering_desc=offering_desc
     )
-    resp: RunOutput = agent.run(prompt)
-    data = extract_json_or_raise(str(resp.content))
-    companies = data.get("companies", [])
-    return companies[: max(1, min(max_companies, 10))]
+    limit = max(1, min(max_companies, 10))
+    shown: Set[str] = set()
 
+    def on_item(company: Dict[str, Any]) -> None:
+        key = _company_key(company)
+        if on_company and key not in shown and len(shown) < limit:
+            shown.add(key)
+            on_company(company)
 
-def run_contact_finder(agent: Agent, companies: List[Dict[str, str]], target_desc: str, offering_desc: str) -> List[Dict[str, Any]]:
-    prompt = prompts.CONTACT_FINDER_PROMPT_TEMPLATE.format(
-        target_desc=target_desc,
-        offering_desc=offering_desc,
-        companies_json=json.dumps(companies, ensure_ascii=False)
-    )
-    resp: RunOutput = agent.run(prompt)
-    data = extract_json_or_raise(str(resp.content))
-    return data.get("companies", [])
+    companies = stream_json_items(agent, prompt, CompanyList, on_item)
+    return dedupe_companies(companies)[:limit]
 
 
-def run_research(agent: Agent, companies: List[Dict[str, str]]) -> List[Dict[str, Any]]:
-    prompt = prompts.RESEARCH_PROMPT_TEMPLATE.format(
-        companies_json=json.dumps(companies, ensure_ascii=False)
-    )
-    resp: RunOutput = agent.run(prompt)
-    data = extract_json_or_raise(str(resp.content))
-    return data.get("companies", [])
+async def _gather_or_cancel(coros: List[Awaitable[Any]]) -> List[Any]:
+    """`asyncio.gather` that cancels the remaining runs as soon as one fails, so they stop spending tokens."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _fan_out(
+    companies: List[Dict[str, str]],
+    run_one: Callable[[Dict[str, str]], Awaitable[List[Dict[str, Any]]]],
+    max_concurrency: int,
+) -> List[Dict[str, Any]]:
+    """Run `run_one` for every company concurrently, keeping input order in the flattened result."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(company: Dict[str, str]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await run_one(company)
+
+    results = await _gather_or_cancel([bounded(c) for c in companies])
+    return [item for items in results for item in items]
 
 
-def run_email_writer(agent: Agent, contacts_data: List[Dict[str, Any]], research_data: List[Dict[str, Any]], offering_desc: str, sender_name: str, sender_company: str, calendar_link: Optional[str]) -> List[Dict[str, str]]:
-    prompt = prompts.EMAIL_WRITER_PROMPT_TEMPLATE.format(
+async def arun_enrichment(
+    agent: Agent,
+    companies: List[Dict[str, str]],
+    target_desc: str,
+    offering_desc: str,
+    on_company: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_concurrency: int = COMPANY_FANOUT_MAX_CONCURRENCY,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Find contacts and research insights with one agent run per company; returns (contacts_data, research_data).
+
+    `on_company` is called with each enriched company as its run finishes.
+    """
+    async def enrich_one(company: Dict[str, str]) -> List[Dict[str, Any]]:
+        prompt = prompts.ENRICHMENT_SINGLE_PROMPT_TEMPLATE.substitute(
+            target_desc=target_desc,
+            offering_desc=offering_desc,
+            company_json=_dumps(_slim([company], ENRICHMENT_COMPANY_KEYS)[0])
+        )
+        resp: RunOutput = await _arun_agent(agent, prompt)
+        enriched = _dump_items(await aparse(str(resp.content), EnrichmentList))[:1]
+        if on_company:
+            for c in enriched:
+                on_company(c)
+        return enriched
+
+    enriched = await _fan_out(companies, enrich_one, max_concurrency)
+    contacts_data = [{"name": c.get("name", ""), "contacts": c.get("contacts", [])} for c in enriched]
+    research_data = [{"name": c.get("name", ""), "insights": c.get("insights", [])} for c in enriched]
+    return contacts_data, research_data
+
+
+def run_email_writer(agent: Agent, contacts_data: List[Dict[str, Any]], research_data: List[Dict[str, Any]], offering_desc: str, sender_name: str, sender_company: str, calendar_link: Optional[str], on_email: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, str]]:
+    prompt = prompts.EMAIL_WRITER_PROMPT_TEMPLATE.substitute(
         sender_name=sender_name,
         sender_company=sender_company,
         offering_desc=offering_desc,
         calendar_link=calendar_link or 'N/A',
-        contacts_json=json.dumps(contacts_data, ensure_ascii=False),
-        research_json=json.dumps(research_data, ensure_ascii=False)
+        contacts_json=_dumps(contacts_data),
+        research_json=_dumps(research_data)
     )
-    resp: RunOutput = agent.run(prompt)
-    data = extract_json_or_raise(str(resp.content))
-    return data.get("emails", [])
+    return stream_json_items(agent, prompt, EmailList, on_email)
+
+
+def build_single_email_prompts(contacts_data: List[Dict[str, Any]], research_data: List[Dict[str, Any]], offering_desc: str, sender_name: str, sender_company: str, calendar_link: Optional[str]) -> List[str]:
+    """One email-writer prompt per contact, carrying only that company's research insights."""
+    insights_by_company = {r.get("name", ""): r.get("insights", []) for r in research_data}
+    return [
+        prompts.EMAIL_WRITER_SINGLE_PROMPT_TEMPLATE.substitute(
+            sender_name=sender_name,
+            sender_company=sender_company,
+            offering_desc=offering_desc,
+            calendar_link=calendar_link or 'N/A',
+            company=c.get("name", ""),
+            contact_json=_dumps(contact),
+            insights_json=_dumps(insights_by_company.get(c.get("name", ""), [])),
+        )
+        for c in contacts_data
+        for contact in c.get("contacts", [])[:3]
+    ]
+
+
+async def arun_email_writer_pool(
+    agent: Agent,
+    email_prompts: List[str],
+    on_email: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_concurrency: int = EMAIL_WRITER_MAX_CONCURRENCY,
+) -> List[Dict[str, str]]:
+    """Write one email per prompt concurrently, at most `max_concurrency` requests in flight."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def write_one(prompt: str) -> List[Dict[str, str]]:
+        async with semaphore:
+            resp: RunOutput = await _arun_agent(agent, prompt)
+        emails = _dump_items(await aparse(str(resp.content), EmailList))
+        if on_email:
+            for e in emails:
+                on_email(e)
+        return emails
+
+    results = await _gather_or_cancel([write_one(p) for p in email_prompts])
+    return [email for emails in results for email in emails]
+
+
+def submit_email_batch(style_key: str, email_prompts: List[str]) -> str:
+    """Submit one request per prompt through the OpenAI Batch API and return the batch id.
+
+    Batch requests cost 50% less but may take up to 24h to complete, so nothing waits on
+    them here; the UI polls the batch from session state (see `follow_email_batch`).
+    """
+    client = OpenAI()
+    system_prompt = "\n".join(prompts.get_email_writer_instructions(style_key))
+    lines = [
+        _dumps({
+            "custom_id": f"email-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": EMAIL_WRITER_MODEL_ID,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "response_format": {"type": "json_object"},
+            },
+        })
+        for i, prompt in enumerate(email_prompts)
+    ]
+    batch_input = client.files.create(file=("emails.jsonl", "\n".join(lines).encode()), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+def collect_email_batch(batch_id: str, num_prompts: int) -> Tuple[List[Dict[str, str]], int, str]:
+    """Read a finished batch; returns the emails, how many prompts produced none, and the first error."""
+    client = OpenAI()
+    batch = client.batches.retrieve(batch_id)
+    by_index: Dict[int, List[Dict[str, str]]] = {}
+    output = client.files.content(batch.output_file_id).text if batch.output_file_id else ""
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        result = orjson.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        index = int(result["custom_id"].rsplit("-", 1)[1])
+        try:
+            by_index[index] = _dump_items(parse(content, EmailList))
+        except (ValueError, RunFailedError):
+            # One unrepairable email must not throw away the rest of a completed batch
+            continue
+    # Requests that errored are listed in the error file, not in the output file;
+    # responses the fixer couldn't repair are missing from by_index too
+    failed = num_prompts - len(by_index)
+    reason = ""
+    if failed and batch.error_file_id:
+        error_lines = [line for line in client.files.content(batch.error_file_id).text.splitlines() if line.strip()]
+        if error_lines:
+            first = orjson.loads(error_lines[0])
+            error = first.get("error") or ((first.get("response") or {}).get("body") or {}).get("error") or {}
+            reason = error.get("message", "")
+    return [email for i in sorted(by_index) for email in by_index[i]], failed, reason
+
+
+class PipelineCancelled(Exception):
+    """Raised on the pipeline worker thread once the user cancels the run."""
+
+
+class PipelineStatus:
+    """Progress shared between the pipeline worker thread and the Streamlit script thread.
+
+    Every `update` is also a cancellation point: after `cancel()` the next progress report
+    from the worker raises `PipelineCancelled`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._percent = 0
+        self._message = ""
+        self._detail = ""
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def update(self, percent: Optional[int] = None, message: Optional[str] = None, detail: Optional[str] = None) -> None:
+        with self._lock:
+            if percent is not None:
+                self._percent = percent
+            if message is not None:
+                self._message = message
+            if detail is not None:
+                self._detail = detail
+        if self.cancelled:
+            raise PipelineCancelled("Run cancelled")
+
+    def render(self, progress: Any, stage_msg: Any, details: Any) -> None:
+        with self._lock:
+            percent, message, detail = self._percent, self._message, self._detail
+        progress.progress(percent)
+        if message:
+            stage_msg.info(message)
+        if detail:
+            details.write(detail)
+
+
+@st.cache_resource(show_spinner=False)
+def _pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="gtm_pipeline")
+
+
+def run_pipeline(
+    status: PipelineStatus,
+    company_agent: Agent,
+    enrichment_agent: Agent,
+    email_agent: Agent,
+    email_fanout_agent: Agent,
+    email_style: str,
+    use_batch: bool,
+    target_desc: str,
+    offering_desc: str,
+    sender_name: str,
+    sender_company: str,
+    calendar_link: Optional[str],
+    num_companies: int,
+) -> Dict[str, List[Any]]:
+    """Run all four stages. Runs on a worker thread, so it reports through `status` and never touches `st`."""
+    # 1. Companies
+    status.update(message="1/4 Finding companies...")
+    companies = run_company_finder(
+        company_agent,
+        target_desc,
+        offering_desc,
+        max_companies=num_companies,
+        on_company=lambda c: status.update(detail=f"Found {c.get('name', '')}"),
+    )
+    status.update(percent=25, detail=f"Found {len(companies)} companies")
+
+    # 2 + 3. Contacts and research, one enrichment run per company
+    status.update(message="2-3/4 Finding contacts (2–3 per company) and researching insights (website + Reddit)...")
+    contacts_data, research_data = _run_async(arun_enrichment(
+        enrichment_agent,
+        companies,
+        target_desc,
+        offering_desc,
+        on_company=lambda c: status.update(detail=f"Enriched {c.get('name', '')}"),
+    )) if companies else ([], [])
+    status.update(percent=75, detail=f"Collected contacts and research for {len(contacts_data)} companies")
+
+    # 4. Emails
+    status.update(message="4/4 Writing personalized emails...")
+    writer_args = (contacts_data, research_data, offering_desc, sender_name, sender_company, calendar_link)
+    email_batch: Optional[Dict[str, Any]] = None
+    if not contacts_data:
+        emails = []
+    elif use_batch:
+        email_prompts = build_single_email_prompts(*writer_args)
+        email_batch = {"id": submit_email_batch(email_style, email_prompts), "prompts": len(email_prompts)}
+        emails = []
+    elif len(contacts_data) > EMAIL_FANOUT_MIN_COMPANIES:
+        emails = _run_async(arun_email_writer_pool(
+            email_fanout_agent,
+            build_single_email_prompts(*writer_args),
+            on_email=lambda e: status.update(detail=f"Drafted email to {e.get('contact', '')} at {e.get('company', '')}"),
+        ))
+    else:
+        emails = run_email_writer(
+            email_agent,
+            *writer_args,
+            on_email=lambda e: status.update(detail=f"Drafted email to {e.get('contact', '')} at {e.get('company', '')}"),
+        )
+    if email_batch:
+        try:
+            status.update(percent=100, detail=f"Submitted email batch {email_batch['id']}")
+        except PipelineCancelled:
+            OpenAI().batches.cancel(email_batch["id"])
+            raise
+    else:
+        status.update(percent=100, detail=f"Generated {len(emails)} emails")
+
+    return {
+        "companies": companies,
+        "contacts": contacts_data,
+        "research": research_data,
+        "emails": emails,
+        "email_batch": email_batch,
+        "warnings": [],
+    }
+
+
+def _on_debug_toggle() -> None:
+    os.environ["GTM_DEBUG"] = "1" if st.session_state["gtm_debug"] else "0"
+    # Agents read the flag at construction, so rebuild them on the next run
+    for create_agent in (
+        create_company_finder_agent,
+        create_email_writer_agent,
+        create_email_fanout_agent,
+        create_combined_enrichment_agent,
+        create_json_fixer_agent,
+    ):
+        create_agent.clear()
+
+
+@st.fragment(run_every=BATCH_POLL_INTERVAL_SECONDS)
+def follow_email_batch() -> None:
+    """Poll the submitted email batch kept in the results; no pool worker waits on it."""
+    results = st.session_state["gtm_results"]
+    batch = results["email_batch"]
+    batch_status = OpenAI().batches.retrieve(batch["id"]).status
+    if batch_status not in BATCH_TERMINAL_STATUSES:
+        st.info(f"Email batch {batch['id']} is {batch_status}; emails appear here when it completes (up to 24h).")
+        if st.button("Cancel email batch"):
+            OpenAI().batches.cancel(batch["id"])
+        return
+    if batch_status == "completed":
+        emails, failed, reason = collect_email_batch(batch["id"], batch["prompts"])
+        results["emails"] = emails
+        if failed:
+            warning = f"{failed} of {batch['prompts']} email requests failed and produced no email"
+            results["warnings"].append(f"{warning}: {reason}" if reason else warning)
+    else:
+        results["warnings"].append(f"Email batch {batch['id']} ended with status '{batch_status}'")
+    results["email_batch"] = None
+    # Full rerun so the emails and warnings render outside the fragment
+    st.rerun()
+
+
+def _run_outcome(future: Future, status: PipelineStatus) -> Tuple[str, str]:
+    """Store a finished run's results and return the (level, message) notice to show for it."""
+    if future.cancelled():
+        return "warning", "Run cancelled"
+    try:
+        st.session_state["gtm_results"] = future.result()
+        return "success", "Completed"
+    except Exception as e:
+        # Check the flag, not the exception type: the worker raises the PipelineCancelled of
+        # the script run that started it, and every rerun defines a new class
+        if status.cancelled:
+            return "warning", "Run cancelled"
+        return "error", f"Pipeline failed: {e}"
+
+
+@st.fragment(run_every=STATUS_POLL_INTERVAL_SECONDS)
+def follow_run() -> None:
+    """Show the active run's progress, refreshing on a timer until it finishes.
+
+    Each refresh is a short fragment rerun instead of a polling loop, so the script never
+    blocks and widget changes (Cancel included) take effect right away.
+    """
+    run = st.session_state.get("gtm_run")
+    if run is None:
+        return
+    future, status = run["future"], run["status"]
+    if st.button("Cancel run", disabled=status.cancelled):
+        future.cancel()
+        status.cancel()
+    status.render(st.progress(0), st.empty(), st.empty())
+    if not future.done():
+        return
+    st.session_state.pop("gtm_run", None)
+    st.session_state["gtm_notice"] = _run_outcome(future, status)
+    # Full rerun so the results render and Start is enabled again
+    st.rerun()
+
 
 def main() -> None:
     st.set_page_config(page_title="GTM B2B Outreach", layout="wide")
+    init_exa_cache()
 
     # Sidebar: API keys
     st.sidebar.header("API Configuration")
@@ -158,12 +1161,26 @@ def main() -> None:
     if not openai_key or not exa_key:
         st.sidebar.warning("Enter both API keys to enable the app")
 
+    use_batch = st.sidebar.checkbox(
+        "Async batch (50% cheaper, slower)",
+        value=False,
+        help="Write emails through the OpenAI Batch API. Results can take up to 24h.",
+    )
+    with st.sidebar.expander("Advanced"):
+        st.checkbox(
+            "Debug logging",
+            value=debug_enabled(),
+            key="gtm_debug",
+            on_change=_on_debug_toggle,
+            help="Print agent tool calls and model output to the server log (sets GTM_DEBUG=1)",
+        )
+
     # Inputs
     st.title("GTM B2B Outreach Multi Agent Team")
     st.info(
         "GTM teams often need to reach out for demos and discovery calls, but manual research and personalization is slow. "
-        "This app uses GPT-5 with a multi-agent workflow to find target companies, identify contacts, research genuine insights (website + Reddit), "
-        "and generate tailored outreach emails in your chosen style."
+        "This app uses a multi-agent workflow to find target companies (GPT-4o-mini), then GPT-5 to identify contacts, research genuine insights "
+        "(website + Reddit), and generate tailored outreach emails in your chosen style."
     )
     col1, col2 = st.columns(2)
     with col1:
@@ -181,76 +1198,49 @@ def main() -> None:
             help="Choose the tone/format for the generated emails",
         )
 
-    if st.button("Start Outreach", type="primary"):
+    run = st.session_state.get("gtm_run")
+    if st.button("Start Outreach", type="primary", disabled=run is not None):
         # Validate
         if not openai_key or not exa_key:
             st.error("Please provide API keys in the sidebar")
         elif not target_desc or not offering_desc:
             st.error("Please fill in target companies and offering")
         else:
-            # Stage-by-stage progress UI
-            progress = st.progress(0)
-            stage_msg = st.empty()
-            details = st.empty()
             try:
                 # Prepare agents
                 company_agent = create_company_finder_agent()
-                contact_agent = create_contact_finder_agent()
-                research_agent = create_research_agent()
+                enrichment_agent = create_combined_enrichment_agent()
                 email_agent = create_email_writer_agent(email_style)
-
-                # 1. Companies
-                stage_msg.info("1/4 Finding companies...")
-                companies = run_company_finder(
+                email_fanout_agent = create_email_fanout_agent(email_style)
+            except Exception as e:
+                st.error(f"{e}")
+            else:
+                status = PipelineStatus()
+                future = _pool().submit(
+                    run_pipeline,
+                    status,
                     company_agent,
-                    target_desc.strip(),
-                    offering_desc.strip(),
-                    max_companies=int(num_companies),
-                )
-                progress.progress(25)
-                details.write(f"Found {len(companies)} companies")
-
-                # 2. Contacts
-                stage_msg.info("2/4 Finding contacts (2–3 per company)...")
-                contacts_data = run_contact_finder(
-                    contact_agent,
-                    companies,
-                    target_desc.strip(),
-                    offering_desc.strip(),
-                ) if companies else []
-                progress.progress(50)
-                details.write(f"Collected contacts for {len(contacts_data)} companies")
-
-                # 3. Research
-                stage_msg.info("3/4 Researching insights (website + Reddit)...")
-                research_data = run_research(research_agent, companies) if companies else []
-                progress.progress(75)
-                details.write(f"Compiled research for {len(research_data)} companies")
-
-                # 4. Emails
-                stage_msg.info("4/4 Writing personalized emails...")
-                emails = run_email_writer(
+                    enrichment_agent,
                     email_agent,
-                    contacts_data,
-                    research_data,
+                    email_fanout_agent,
+                    email_style,
+                    use_batch,
+                    target_desc.strip(),
                     offering_desc.strip(),
                     sender_name.strip() or "Sales Team",
                     sender_company.strip() or "Our Company",
                     calendar_link.strip() or None,
-                ) if contacts_data else []
-                progress.progress(100)
-                details.write(f"Generated {len(emails)} emails")
-
-                st.session_state["gtm_results"] = {
-                    "companies": companies,
-                    "contacts": contacts_data,
-                    "research": research_data,
-                    "emails": emails,
-                }
-                stage_msg.success("Completed")
-            except Exception as e:
-                stage_msg.error("Pipeline failed")
-                st.error(f"{e}")
+                    int(num_companies),
+                )
+                # Kept across reruns so touching a widget reattaches instead of abandoning the run
+                st.session_state["gtm_run"] = {"future": future, "status": status}
+
+    if "gtm_run" in st.session_state:
+        follow_run()
+    notice = st.session_state.pop("gtm_notice", None)
+    if notice:
+        level, message = notice
+        getattr(st, level)(message)
 
     # Show results if present
     results = st.session_state.get("gtm_results")
@@ -259,40 +1249,48 @@ def main() -> None:
         contacts = results.get("contacts", [])
         research = results.get("research", [])
         emails = results.get("emails", [])
+        for warning in results.get("warnings", []):
+            st.warning(warning)
 
         st.subheader("Top target companies")
         if companies:
-            for idx, c in enumerate(companies, 1):
-                st.markdown(f"**{idx}. {c.get('name','')}**  ")
-                st.write(c.get("website", ""))
-                st.write(c.get("why_fit", ""))
+            companies_df = pd.DataFrame(companies).reindex(columns=["name", "website", "why_fit"])
+            st.dataframe(companies_df, use_container_width=True, hide_index=True)
         else:
             st.info("No companies found")
         st.divider()
 
         st.subheader("Contacts found")
-        if contacts:
-            for c in contacts:
-                st.markdown(f"**{c.get('name','')}**")
-                for p in c.get("contacts", [])[:3]:
-                    inferred = " (inferred)" if p.get("inferred") else ""
-                    st.write(f"- {p.get('full_name','')} | {p.get('title','')} |  {p.get('email','')}{inferred}")
+        contacts_df = pd.json_normalize(
+            [{"name": c.get("name", ""), "contacts": c.get("contacts", [])[:3]} for c in contacts],
+            record_path="contacts",
+            meta="name",
+            meta_prefix="company.",
+        ) if contacts else pd.DataFrame()
+        if not contacts_df.empty:
+            contacts_df = contacts_df.reindex(columns=["company.name", "full_name", "title", "email", "inferred"])
+            contacts_df = contacts_df.rename(columns={"company.name": "company"})
+            st.dataframe(contacts_df, use_container_width=True, hide_index=True)
         else:
             st.info("No contacts found")
         st.divider()
 
         st.subheader("Research insights")
-        if research:
-            for r in research:
-                st.markdown(f"**{r.get('name','')}**")
-                for insight in r.get("insights", [])[:4]:
-                    st.write(f"- {insight}")
+        research_rows = [
+            {"company": r.get("name", ""), "insight": insight}
+            for r in research
+            for insight in r.get("insights", [])[:4]
+        ]
+        if research_rows:
+            st.dataframe(pd.DataFrame(research_rows), use_container_width=True, hide_index=True)
         else:
             st.info("No research insights")
         st.divider()
 
         st.subheader("Suggested Outreach Emails")
-        if emails:
+        if results.get("email_batch"):
+            follow_email_batch()
+        elif emails:
             for i, e in enumerate(emails, 1):
                 with st.expander(f"{i}. {e.get('company','')} → {e.get('contact','')}"):
                     st.write(f"Subject: {e.get('subject','')}")
@@ -1,25 +1,94 @@
+import functools
+from string import Template
 from typing import List
 
+# Static blocks are placed first in every instruction list and prompt template so the
+# prefix sent to OpenAI is byte-identical across runs and eligible for prompt caching.
+# Per-run values (targeting, offering, JSON payloads) always come last.
+
+JSON_OUTPUT_RULES = [
+    "Output format rules (apply to every response):",
+    "- Respond with a single JSON object and nothing else: no markdown fences, no commentary before or after the JSON.",
+    "- Use double quotes for all keys and string values. Do not use trailing commas, comments, NaN, or undefined.",
+    "- Every key listed in the schema must be present. Use an empty string or empty list when a value is unknown; never omit a key.",
+    "- Do not add keys that are not in the schema.",
+    "- Keep company names exactly as they appear on the company's own website so downstream steps can join records by name.",
+    "- Websites must be full URLs including the scheme, e.g. https://example.com, pointing at the company's primary domain.",
+]
+
+RESEARCH_GUIDELINES = [
+    "Research guidelines (apply to every search):",
+    "- Prefer primary sources: the company's own website (home, about, blog, careers, pricing, product and docs pages), "
+    "official press releases, and first-party social accounts.",
+    "- For community signal use Reddit (site:reddit.com) discussions mentioning the company or its product; "
+    "prefer threads from the last 12 months and note the subreddit context when it matters.",
+    "- Be specific and verifiable. Cite concrete facts such as a product launch, a pricing change, a hiring push, "
+    "a customer segment, a tech stack choice, or a recurring user complaint. Avoid generic praise like 'innovative leader'.",
+    "- Never fabricate people, titles, quotes, funding rounds, or metrics. If something cannot be confirmed, leave it out.",
+    "- Issue independent searches in the same batched tool-call response instead of one at a time.",
+    "- Stop searching once you have enough information to fill the schema; do not repeat identical queries.",
+]
+
+CONTACT_GUIDELINES = [
+    "Contact guidelines:",
+    "- Prioritize roles from Founder's Office, GTM (Marketing/Growth), Sales leadership, "
+    "Partnerships/Business Development, and Product Marketing.",
+    "- Search queries can include patterns like '<Company> email format', 'contact', 'team', 'leadership', and role titles.",
+    "- Only include people who currently work at the company according to a recent source.",
+    "- If direct emails are not found, infer likely email using common formats (e.g., first.last@domain) "
+    "from the company's primary domain, and mark inferred=true. Mark inferred=false only when the email was found verbatim.",
+]
+
+COMPANY_JSON_SCHEMA = (
+    'JSON schema: {"companies": [{"name": string, "website": string, "why_fit": string (1-2 lines)}]}'
+)
+
+ENRICHMENT_JSON_SCHEMA = (
+    'JSON schema: {"companies": [{"name": string, "contacts": '
+    '[{"full_name": string, "title": string, "email": string, "inferred": boolean}], "insights": [string]}]}'
+)
+
+EMAIL_JSON_SCHEMA = (
+    'JSON schema: {"emails": [{"company": string, "contact": string, "subject": string, "body": string}]}'
+)
+
+EMAIL_STYLE_GUIDE = [
+    "Email writing guide (applies to every style):",
+    "- Subject line: under 8 words, specific to the company, no clickbait, no ALL CAPS, no emojis.",
+    "- Opening: reference one concrete research insight in the first 1-2 lines so the reader sees genuine effort.",
+    "- Body: connect that insight to the sender's offering in plain language; one clear value proposition, no feature lists.",
+    "- Address the contact by first name and tailor the angle to their title (e.g., pipeline for Sales, positioning for Marketing).",
+    "- Never claim prior relationships, mutual connections, or results that are not provided.",
+    "- Close with the sender name and company; include the calendar link only when one is provided (not 'N/A').",
+    "- Use plain text in the body with short paragraphs separated by blank lines; no markdown, no bullet symbols.",
+]
+
 COMPANY_FINDER_INSTRUCTIONS = [
     "You are CompanyFinderAgent. Use ExaTools to search the web for companies that match the targeting criteria.",
     "Return ONLY valid JSON with key 'companies' as a list; respect the requested limit provided in the user prompt.",
     "Each item must have: name, website, why_fit (1-2 lines).",
+    COMPANY_JSON_SCHEMA,
+    *JSON_OUTPUT_RULES,
+    *RESEARCH_GUIDELINES,
 ]
 
-CONTACT_FINDER_INSTRUCTIONS = [
-    "You are ContactFinderAgent. Use ExaTools to find 1-2 relevant decision makers per company and their emails if available.",
-    "Prioritize roles from Founder's Office, GTM (Marketing/Growth), Sales leadership, Partnerships/Business Development, and Product Marketing.",
-    "Search queries can include patterns like '<Company> email format', 'contact', 'team', 'leadership', and role titles.",
-    "If direct emails are not found, infer likely email using common formats (e.g., first.last@domain), but mark inferred=true.",
-    "Return ONLY valid JSON with key 'companies' as a list; each has: name, contacts: [{full_name, title, email, inferred}]",
+ENRICHMENT_AGENT_INSTRUCTIONS = [
+    "You are EnrichmentAgent. For the company in the prompt, use ExaTools to find relevant decision makers and to research genuine insights.",
+    "Emit the company's contacts search and its website/Reddit research search together in one batched tool-call response.",
+    "Insights: 2-4 interesting, non-generic points about the company from its official website and Reddit discussions (site:reddit.com).",
+    "Return ONLY valid JSON with key 'companies' as a list holding that one company: name, contacts: [{full_name, title, email, inferred}], insights: [strings].",
+    ENRICHMENT_JSON_SCHEMA,
+    *CONTACT_GUIDELINES,
+    *JSON_OUTPUT_RULES,
+    *RESEARCH_GUIDELINES,
 ]
 
-RESEARCH_AGENT_INSTRUCTIONS = [
-    "You are ResearchAgent. For each company, collect concise, valuable insights from:",
-    "1) Their official website (about, blog, product pages)",
-    "2) Reddit discussions (site:reddit.com mentions)",
-    "Summarize 2-4 interesting, non-generic points per company that a human would bring up in an email to show genuine effort.",
-    "Return ONLY valid JSON with key 'companies' as a list; each has: name, insights: [strings].",
+JSON_FIXER_INSTRUCTIONS = [
+    "You are JsonFixerAgent. You receive a model response that failed validation, the validation errors, and the target JSON schema.",
+    "Rewrite the response as a single JSON object that matches the schema exactly, keeping every value from the original that fits.",
+    "Inside each record, fill missing required strings with an empty string, missing lists with an empty list, and missing booleans with false.",
+    "If the original contains no records at all (an error message, prose, or nothing), return an empty JSON object {}.",
+    "Do not invent new records or research. Return ONLY the JSON object.",
 ]
 
 EMAIL_STYLES = {
@@ -29,43 +98,67 @@ EMAIL_STYLES = {
     "Consultative": "Style: Consultative. Insight-led, frames observed problems and tailored solution hypotheses; soft CTA.",
 }
 
+# Cached per style; callers must treat the returned list as read-only.
+@functools.lru_cache(maxsize=32)
 def get_email_writer_instructions(style_key: str) -> List[str]:
     style_instruction = EMAIL_STYLES.get(style_key, EMAIL_STYLES["Professional"])
+    # The style line varies per selection, so it goes after the shared static block.
     return [
         "You are EmailWriterAgent. Write concise, personalized B2B outreach emails.",
-        style_instruction,
         "Return ONLY valid JSON with key 'emails' as a list of items: {company, contact, subject, body}.",
         "Length: 120-160 words. Include 1-2 lines of strong personalization referencing research insights (company website and Reddit findings).",
         "CTA: suggest a short intro call; include sender company name and calendar link if provided.",
+        EMAIL_JSON_SCHEMA,
+        *EMAIL_STYLE_GUIDE,
+        *JSON_OUTPUT_RULES,
+        style_instruction,
     ]
 
-COMPANY_FINDER_PROMPT_TEMPLATE = (
-    "Find exactly {max_companies} companies that are a strong B2B fit given the user inputs.\n"
-    "Targeting: {target_desc}\n"
-    "Offering: {offering_desc}\n"
-    "For each, provide: name, website, why_fit (1-2 lines)."
+COMPANY_FINDER_PROMPT_TEMPLATE = Template(
+    "Find companies that are a strong B2B fit given the user inputs below.\n"
+    "For each, provide: name, website, why_fit (1-2 lines).\n"
+    "Return exactly the requested number of companies.\n"
+    "User inputs:\n"
+    "Number of companies: $max_companies\n"
+    "Targeting: $target_desc\n"
+    "Offering: $offering_desc"
 )
 
-CONTACT_FINDER_PROMPT_TEMPLATE = (
-    "For each company below, find 2-3 relevant decision makers and emails (if available). Ensure at least 2 per company when possible, and cap at 3.\n"
-    "If not available, infer likely email and mark inferred=true.\n"
-    "Targeting: {target_desc}\nOffering: {offering_desc}\n"
-    "Companies JSON: {companies_json}\n"
-    "Return JSON: {{companies: [{{name, contacts: [{{full_name, title, email, inferred}}]}}]}}"
+ENRICHMENT_SINGLE_PROMPT_TEMPLATE = Template(
+    "For the company below, find 2-3 relevant decision makers and emails (if available), and gather 2-4 interesting insights "
+    "from their website and Reddit that would help personalize outreach.\n"
+    "If an email is not available, infer a likely email and mark inferred=true.\n"
+    "Return JSON: {companies: [{name, contacts: [{full_name, title, email, inferred}], insights: [string, ...]}]} "
+    "with exactly one item for this company.\n"
+    "User inputs:\n"
+    "Targeting: $target_desc\nOffering: $offering_desc\n"
+    "Company JSON: $company_json"
 )
 
-RESEARCH_PROMPT_TEMPLATE = (
-    "For each company, gather 2-4 interesting insights from their website and Reddit that would help personalize outreach.\n"
-    "Companies JSON: {companies_json}\n"
-    "Return JSON: {{companies: [{{name, insights: [string, ...]}}]}}"
+EMAIL_WRITER_PROMPT_TEMPLATE = Template(
+    "Write personalized outreach emails for the following contacts.\n"
+    "Return JSON with key 'emails' as a list of {company, contact, subject, body}.\n"
+    "Sender: $sender_name at $sender_company.\n"
+    "Offering: $offering_desc.\n"
+    "Calendar link: $calendar_link.\n"
+    "Contacts JSON: $contacts_json\n"
+    "Research JSON: $research_json"
 )
 
-EMAIL_WRITER_PROMPT_TEMPLATE = (
-    "Write personalized outreach emails for the following contacts.\n"
-    "Sender: {sender_name} at {sender_company}.\n"
-    "Offering: {offering_desc}.\n"
-    "Calendar link: {calendar_link}.\n"
-    "Contacts JSON: {contacts_json}\n"
-    "Research JSON: {research_json}\n"
-    "Return JSON with key 'emails' as a list of {{company, contact, subject, body}}."
+EMAIL_WRITER_SINGLE_PROMPT_TEMPLATE = Template(
+    "Write one personalized outreach email for the contact below.\n"
+    "Return JSON with key 'emails' as a list containing exactly one {company, contact, subject, body}.\n"
+    "Sender: $sender_name at $sender_company.\n"
+    "Offering: $offering_desc.\n"
+    "Calendar link: $calendar_link.\n"
+    "Company: $company\n"
+    "Contact JSON: $contact_json\n"
+    "Research insights JSON: $insights_json"
+)
+
+JSON_FIXER_PROMPT_TEMPLATE = Template(
+    "Fix this JSON to match the schema.\n"
+    "Schema: $schema_json\n"
+    "Validation errors:\n$errors\n"
+    "Original response:\n$original"
 )